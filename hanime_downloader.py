@@ -13,18 +13,19 @@ Usage:
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import sys
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from src.config import parse_arguments
+from src.config import MAX_EPISODE_WORKERS, parse_arguments
 from src.downloader.crawler_utils import (
     generate_all_episode_urls,
     get_all_episodes_ids,
     get_episode_id,
     get_hanime_info,
 )
-from src.downloader.episode_downloader import EpisodeDownloader
+from src.downloader.episode_downloader import EpisodeDownloader, EpisodeDownloadError
 from src.general_utils import clear_terminal
 from src.managers.live_manager import LiveManager, initialize_managers
 
@@ -35,17 +36,24 @@ if TYPE_CHECKING:
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
-def validate_and_download(url: str, live_manager: LiveManager, args: Namespace) -> None:
+async def validate_and_download(
+    url: str,
+    live_manager: LiveManager,
+    args: Namespace,
+    episode_info: dict[str, Any] | None = None,
+) -> None:
     """Validate the provided URL, and initiate the download process."""
     episode_downloader = EpisodeDownloader(
         url=url,
         live_manager=live_manager,
         args=args,
+        max_workers=args.workers,
+        episode_info=episode_info,
     )
-    episode_downloader.download()
+    await episode_downloader.download()
 
 
-def handle_download_process(
+async def handle_download_process(
     url: str,
     live_manager: LiveManager,
     args: Namespace,
@@ -53,8 +61,9 @@ def handle_download_process(
     """Handle the download process for one or multiple episodes based on user arguments.
 
     If the `--all-episodes` flag is set in `args`, retrieves all related episode URLs
-    from the given `url`, then downloads each episode sequentially using
-    `validate_and_download`.
+    from the given `url`, then downloads up to `MAX_EPISODE_WORKERS` episodes
+    concurrently using `validate_and_download`. An episode that fails does not stop
+    the others.
     """
     if args.all_episodes:
         episode_id = get_episode_id(url)
@@ -62,11 +71,40 @@ def handle_download_process(
         episode_ids = get_all_episodes_ids(hanime_info)
         episode_urls = generate_all_episode_urls(episode_ids)
 
-        for episode_url in episode_urls:
-            validate_and_download(episode_url, live_manager, args)
+        semaphore = asyncio.Semaphore(MAX_EPISODE_WORKERS)
+
+        async def download_episode(
+            episode_url: str, episode_info: dict[str, Any] | None,
+        ) -> None:
+            async with semaphore:
+                await validate_and_download(
+                    episode_url, live_manager, args, episode_info,
+                )
+
+        # Reuse the information already fetched for the requested episode
+        results = await asyncio.gather(
+            *(
+                download_episode(
+                    episode_url, hanime_info if current_id == episode_id else None,
+                )
+                for current_id, episode_url in zip(
+                    episode_ids, episode_urls, strict=True,
+                )
+            ),
+            return_exceptions=True,
+        )
+
+        # Failures reported through EpisodeDownloadError are already logged
+        for episode_url, result in zip(episode_urls, results, strict=True):
+            if isinstance(result, Exception) and not isinstance(
+                result, EpisodeDownloadError,
+            ):
+                live_manager.update_log(
+                    "Episode download error", f"{episode_url}: {result}",
+                )
 
     else:
-        validate_and_download(url, live_manager, args)
+        await validate_and_download(url, live_manager, args)
 
 
 def main() -> None:
@@ -77,10 +115,10 @@ def main() -> None:
 
     try:
         with live_manager.live:
-            handle_download_process(args.url, live_manager, args)
+            asyncio.run(handle_download_process(args.url, live_manager, args))
             live_manager.stop()
 
-    except KeyboardInterrupt:
+    except (EpisodeDownloadError, KeyboardInterrupt):
         sys.exit(1)
 
 
@@ -8,23 +8,25 @@ Usage:
     listed in 'URLs.txt' and log the session activities in 'session.log'.
 """
 
+import asyncio
 import sys
 from argparse import Namespace
 
 from hanime_downloader import validate_and_download
 from src.config import URLS_FILE, parse_arguments
+from src.downloader.episode_downloader import EpisodeDownloadError
 from src.file_utils import read_file, write_file
 from src.general_utils import clear_terminal
 from src.managers.live_manager import initialize_managers
 
 
-def process_urls(urls: list[str], args: Namespace) -> None:
+async def process_urls(urls: list[str], args: Namespace) -> None:
     """Validate and downloads items for a list of URLs."""
     live_manager = initialize_managers(disable_ui=args.disable_ui)
 
     with live_manager.live:
         for url in urls:
-            validate_and_download(url, live_manager, args=args)
+            await validate_and_download(url, live_manager, args=args)
 
         live_manager.stop()
 
@@ -36,8 +38,8 @@ def main() -> None:
     args = parse_arguments(common_only=True)
 
     # Read and process URLs, ignoring empty lines
-    urls = [url.strip() for url in read_file(URLS_FILE) if url.strip()]
-    process_urls(urls, args)
+    urls = [url for url in (line.strip() for line in read_file(URLS_FILE)) if url]
+    asyncio.run(process_urls(urls, args))
 
     # Clear URLs file
     write_file(URLS_FILE)
@@ -47,5 +49,5 @@ if __name__ == "__main__":
     try:
         main()
 
-    except KeyboardInterrupt:
+    except (EpisodeDownloadError, KeyboardInterrupt):
         sys.exit(1)
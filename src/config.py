@@ -4,7 +4,9 @@ These configurations aim to improve modularity and readability by consolidating
 into a single location.
 """
 
-from argparse import ArgumentParser, Namespace
+import os
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from types import MappingProxyType
 
 # ============================
 # Paths and Files
@@ -17,28 +19,52 @@ URLS_FILE = "URLs.txt"         # The file containing the list of URLs to process
 # ============================
 API_URL = "https://hanime.tv/api/v8"           # The API endpoint for Hanime video data.
 VIDEO_URL = "https://hanime.tv/videos/hentai"  # The base URL for Hanime video pages.
-
-# ============================
-# Regex Patterns
-# ============================
-HANIME_NAME_PATTERN = r"https://hanime\.tv/videos/hentai/([A-Za-z0-9]+(-[A-Za-z0-9]+)+)"
+EPISODE_URL_PREFIX = f"{VIDEO_URL}/"           # The prefix of every episode URL.
 
 # ============================
 # Download Settings
 # ============================
-MAX_WORKERS = 8  # The maximum number of threads for concurrent downloads.
+def _available_cpus() -> int:
+    """Return the number of CPUs the process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 4
 
-# Resolution map for selecting video quality
-RESOLUTION_MAP = {
+
+# Segment downloads are I/O bound, so the CPUs are oversubscribed; the cap keeps the
+# number of connections opened to the CDN reasonable.
+MAX_WORKERS = min(32, _available_cpus() * 4)  # The default number of segment workers.
+MAX_EPISODE_WORKERS = 3          # The maximum number of concurrent episode downloads.
+STREAM_CHUNK_SIZE = 64 * 1024    # Bytes read at a time from a segment response.
+WRITE_BUFFER_SIZE = 1024 * 1024  # Bytes of decrypted video buffered per disk write.
+
+# Resolution map for selecting video quality (read-only)
+RESOLUTION_MAP = MappingProxyType({
     "1080p": 0,
     "720p": 1,
     "480p": 2,
     "360p": 3,
-}
+})
 
 # ============================
 # Argument Parsing
 # ============================
+def positive_int(value: str) -> int:
+    """Parse a command-line value as a strictly positive integer."""
+    try:
+        number = int(value)
+
+    except ValueError:
+        number = 0
+
+    if number < 1:
+        message = f"invalid positive integer value: '{value}'"
+        raise ArgumentTypeError(message)
+
+    return number
+
+
 def add_common_arguments(parser: ArgumentParser) -> None:
     """Add arguments shared across parsers."""
     parser.add_argument(
@@ -53,6 +79,12 @@ def add_common_arguments(parser: ArgumentParser) -> None:
         default="720p",
         help="Set the resolution (e.g., '480p', '720p')",
     )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=MAX_WORKERS,
+        help="The maximum number of concurrent segment downloads.",
+    )
     parser.add_argument(
         "--all-episodes",
         action="store_true",
@@ -1,36 +1,73 @@
 """Module for extracting media download links from video pages."""
 
 import logging
-import re
 import sys
-from typing import Any
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, NamedTuple
 
 import httpx
+import orjson
 
-from src.config import API_URL, HANIME_NAME_PATTERN, RESOLUTION_MAP, VIDEO_URL
+from src.config import API_URL, EPISODE_URL_PREFIX, RESOLUTION_MAP, VIDEO_URL
 
+# Shared by all API requests, so that connections to the API are kept alive and
+# reused instead of being rebuilt on every call.
+_CLIENT = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=20.0,
+)
 
-def get_episode_id(url: str) -> None:
-    """Validate the provided URL against a predefined pattern."""
-    if not re.compile(HANIME_NAME_PATTERN, re.IGNORECASE).match(url):
+
+def is_valid_slug(slug: str) -> bool:
+    """Check that a slug is made of two or more alphanumeric words joined by hyphens."""
+    words = slug.split("-")
+    return len(words) > 1 and all(word.isascii() and word.isalnum() for word in words)
+
+
+def get_episode_id(url: str) -> str:
+    """Validate the provided URL and extract the episode ID (slug) from it."""
+    slug = url[len(EPISODE_URL_PREFIX):].rstrip("/")
+
+    if not url.lower().startswith(EPISODE_URL_PREFIX) or not is_valid_slug(slug):
         logging.warning("Invalid URL.")
         sys.exit(0)
 
-    return url.rstrip("/").split("/")[-1]
+    return slug
 
 
+@lru_cache(maxsize=512)
 def get_hanime_info(video_id: str) -> dict[str, Any]:
-    """Retrieve video information from hanime.tv using the provided video ID."""
-    return httpx.get(f"{API_URL}/video?id={video_id}").json()
+    """Retrieve video information from hanime.tv using the provided video ID.
+
+    Results are cached per video ID, so repeated lookups of the same episode do not
+    hit the API again.
+    """
+    return orjson.loads(_CLIENT.get(f"{API_URL}/video?id={video_id}").content)
+
+
+async def fetch_playlist(client: httpx.AsyncClient, stream_url: str) -> str:
+    """Fetch the M3U8 playlist of the given stream."""
+    response = await client.get(stream_url)
+    response.raise_for_status()
+    return response.text
+
+
+async def fetch_key(client: httpx.AsyncClient, key_uri: str) -> bytes:
+    """Fetch the AES-128 decryption key referenced by a playlist."""
+    response = await client.get(key_uri)
+    response.raise_for_status()
+    return response.content
 
 
 def get_all_episodes_ids(info: dict[str, Any]) -> list[str]:
     """Extract the episode IDs (slugs) for a hanime series."""
     episode_infos = info["hentai_franchise_hentai_videos"]
-    return [episode_info["slug"] for episode_info in episode_infos]
+    return list(map(itemgetter("slug"), episode_infos))
 
 
-def generate_all_episode_urls(episode_ids: str) -> str:
+def generate_all_episode_urls(episode_ids: list[str]) -> list[str]:
     """Generate a list of URLs for the given episode IDs."""
     return [f"{VIDEO_URL}/{episode_id}" for episode_id in episode_ids]
 
@@ -45,55 +82,107 @@ def fetch_streams(info: dict[str, Any]) -> list[dict[str, Any]]:
     return info["videos_manifest"]["servers"][0]["streams"]
 
 
-def select_and_validate_stream(
-    resolution_choice: str,
-    streams: list[dict[str, Any]],
-) -> dict[str, Any]:
-    """Select and validate the video stream based on the user's resolution choice.
+class Playlist(NamedTuple):
+    """Fields of an M3U8 playlist needed to download and decrypt its segments."""
+
+    segment_uris: list[str]
+    key_uri: str | None
+    key_iv: bytes | None
+    media_sequence: int
+
+    def segment_iv(self, segment_id: int) -> bytes:
+        """Return the AES-128 IV of a segment.
+
+        Uses the explicit IV of the key tag when present; otherwise, as mandated by the
+        HLS specification, the segment's media sequence number as a 128-bit integer.
+        """
+        if self.key_iv is not None:
+            return self.key_iv
+
+        return (self.media_sequence + segment_id).to_bytes(16, "big")
 
-    Attempts to select the stream at the index corresponding to the given resolution.
-    If it's invalid, not guest-accessible, or doesn't match the intended height,
-    falls back to the first guest-accessible stream with matching height.
-    If none is found, falls back to any guest-accessible stream.
+
+def parse_playlist(playlist: str) -> Playlist:
+    """Extract the segment URIs and the decryption key from an M3U8 playlist.
+
+    Every non-empty line that is not a tag or a comment is a segment URI. The key URI
+    and IV are taken from the first `#EXT-X-KEY` tag, if any.
     """
-    # If the provided resolution is not available, fall back to first index (0)
-    resolution_indx = RESOLUTION_MAP.get(resolution_choice, 0)
+    segment_uris = []
+    key_uri = None
+    key_iv = None
+    media_sequence = 0
 
-    # Extract numeric resolution (e.g., 480 from "480p")
-    target_height = resolution_choice.lower().replace("p", "")
+    for raw_line in playlist.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
 
-    def is_valid_stream(stream: dict[str, Any]) -> bool:
-        return stream.get("is_guest_allowed", False)
+        if line[0] != "#":
+            segment_uris.append(line)
 
-    def match_target_height(stream: dict[str, Any]) -> bool:
-        return stream.get("height") == target_height
+        elif key_uri is None and line.startswith("#EXT-X-KEY:"):
+            key_uri = line.partition('URI="')[2].partition('"')[0] or None
+            iv_hex = line.upper().partition("IV=0X")[2].partition(",")[0]
+            key_iv = bytes.fromhex(iv_hex.zfill(32)) if iv_hex else None
 
-    # Try the selected index first
-    if 0 <= resolution_indx < len(streams):
-        stream = streams[resolution_indx]
-        if is_valid_stream(stream) and match_target_height(stream):
-            return stream
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            media_sequence = int(line.partition(":")[2])
 
-    # Fallback: guest-accessible with matching height
-    for stream in streams:
-        if is_valid_stream(stream) and match_target_height(stream):
-            return stream
+    return Playlist(segment_uris, key_uri, key_iv, media_sequence)
 
-    # Fallback: any guest-accessible stream
-    for stream in streams:
-        if is_valid_stream(stream):
-            return stream
 
-    message = "No guest-accessible stream available."
-    raise ValueError(message)
+def parse_resolution(resolution_choice: str) -> tuple[int, int | None]:
+    """Resolve the user's resolution choice into the values used to rank streams.
 
+    Returns the stream index corresponding to the resolution, falling back to the first
+    index (0) if the resolution is not available, and its numeric height (e.g., 480
+    from "480p"), if any.
+    """
+    resolution_indx = RESOLUTION_MAP.get(resolution_choice, 0)
+    target_height = resolution_choice.lower().rstrip("p")
+    return resolution_indx, int(target_height) if target_height.isdigit() else None
 
-def format_filename(
+
+def select_and_validate_stream(
+    resolution_indx: int,
+    target_height: int | None,
     streams: list[dict[str, Any]],
-    video_id: str,
-    resolution_choice: str,
-) -> str:
-    """Format the file name for the video based on the chosen stream resolution."""
-    stream = select_and_validate_stream(resolution_choice, streams)
+) -> dict[str, Any]:
+    """Select and validate the video stream based on the user's resolution choice.
+
+    Streams are ranked in a single pass: guest-accessible streams always come first,
+    then those matching `target_height`, then the one at `resolution_indx`. Ties go to
+    the earliest stream. Raises if no stream is guest-accessible.
+    """
+    best_stream = None
+    best_score = -1
+
+    for indx, stream in enumerate(streams):
+        height = str(stream.get("height", ""))
+        matches_height = height.isdigit() and int(height) == target_height
+        score = (
+            4 * bool(stream.get("is_guest_allowed", False))
+            + 2 * matches_height
+            + (indx == resolution_indx)
+        )
+        if score > best_score:
+            best_stream, best_score = stream, score
+
+    if best_stream is None or not best_stream.get("is_guest_allowed", False):
+        message = "No guest-accessible stream available."
+        raise ValueError(message)
+
+    return best_stream
+
+
+def format_filename(stream: dict[str, Any], video_id: str) -> str:
+    """Format the file name for the video based on the selected stream resolution."""
     resolution = stream["height"]
     return f"{video_id}-{resolution}p.mp4"
+
+
+def get_stream_size(stream: dict[str, Any]) -> int | None:
+    """Return the approximate size in bytes of a stream, if the API reports it."""
+    filesize_mbs = stream.get("filesize_mbs")
+    return int(float(filesize_mbs) * 1024 * 1024) if filesize_mbs else None
@@ -6,37 +6,134 @@ download experience.
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import os
 import random
-import sys
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple, NoReturn
 
 import httpx
-import m3u8
-from Crypto.Util.Padding import pad, unpad
-from Cryptodome.Cipher import AES
-
-from src.config import MAX_WORKERS
-from src.file_utils import create_download_directory
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from src.config import MAX_WORKERS, STREAM_CHUNK_SIZE, WRITE_BUFFER_SIZE
+from src.file_utils import (
+    advise_sequential_write,
+    create_download_directory,
+    preallocate_file,
+    release_file_cache,
+)
 
 from .crawler_utils import (
+    fetch_key,
+    fetch_playlist,
     fetch_streams,
     format_filename,
     get_episode_id,
     get_hanime_info,
     get_hanime_title,
+    get_stream_size,
+    parse_playlist,
+    parse_resolution,
     select_and_validate_stream,
 )
 
 if TYPE_CHECKING:
     from argparse import Namespace
 
-    from Cryptodome.Cipher._mode_cbc import CbcMode
+    from cryptography.hazmat.primitives.ciphers import CipherContext
 
     from src.managers.live_manager import LiveManager
 
+    from .crawler_utils import Playlist
+
+# AES block size in bytes
+AES_BLOCK_SIZE = algorithms.AES.block_size // 8
+
+# Base delay in seconds before each retry of a failed segment download, doubling up to
+# a 5 s cap, to which up to `_BACKOFF_JITTER` seconds are added
+_BACKOFFS = (0.1, 0.2, 0.4, 0.8, 1.6, 3.2, 5.0)
+_BACKOFF_JITTER = 0.2
+
+# Number of segments written before the output file size is estimated and reserved
+_PREALLOCATE_AFTER = 3
+
+# Number of segments, per worker, that may be downloaded ahead of the one being written
+_SEGMENTS_AHEAD_PER_WORKER = 2
+
+
+def _decrypt_into(
+    decryptor: CipherContext, data: bytes, buffer: bytearray, offset: int,
+) -> int:
+    """Decrypt `data` into `buffer` at `offset`, growing it as needed.
+
+    Returns the offset right after the decrypted bytes.
+    """
+    # The decryptor may emit up to one block more than it is given
+    required_size = offset + len(data) + AES_BLOCK_SIZE - 1
+    if len(buffer) < required_size:
+        buffer.extend(bytes(required_size - len(buffer)))
+
+    with memoryview(buffer) as view:
+        return offset + decryptor.update_into(data, view[offset:])
+
+
+class EpisodeDownloadError(Exception):
+    """Raised when an episode cannot be downloaded, once the failure is logged."""
+
+
+class _StreamSession(NamedTuple):
+    """State shared by all the segment downloads of a stream."""
+
+    client: httpx.AsyncClient
+    semaphore: asyncio.Semaphore
+    playlist: Playlist
+    key: asyncio.Task[algorithms.AES]
+
+
+def _is_retryable(error: httpx.HTTPError) -> bool:
+    """Tell whether a failed request may succeed if retried.
+
+    Connection errors, timeouts, server errors and rate limiting are transient;
+    other client errors (e.g. 403, 404) never recover.
+    """
+    if not isinstance(error, httpx.HTTPStatusError):
+        return True
+
+    status_code = error.response.status_code
+    return (
+        status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+        or status_code == httpx.codes.TOO_MANY_REQUESTS
+    )
+
+
+def _retry_delay(error: httpx.HTTPError, attempt: int) -> float:
+    """Return how long to wait, in seconds, before retrying a failed request.
+
+    The delay comes from `_BACKOFFS`, plus some jitter. A rate-limited response may
+    ask for a longer one through its `Retry-After` header, given in seconds or as a
+    date, which is then honored.
+    """
+    delay = _BACKOFFS[attempt] + random.uniform(0, _BACKOFF_JITTER)  # noqa: S311
+    if (
+        not isinstance(error, httpx.HTTPStatusError)
+        or error.response.status_code != httpx.codes.TOO_MANY_REQUESTS
+    ):
+        return delay
+
+    retry_after = error.response.headers.get("Retry-After", "").strip()
+    if retry_after.isdigit():
+        return max(delay, float(retry_after))
+
+    with contextlib.suppress(TypeError, ValueError):
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(delay, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    return delay
+
 
 class EpisodeDownloader:
     """Class to handle downloading and decrypting an episode from hanime.tv."""
@@ -47,128 +144,207 @@ class EpisodeDownloader:
         live_manager: LiveManager,
         args: Namespace,
         max_workers: int = MAX_WORKERS,
+        episode_info: dict[str, Any] | None = None,
     ) -> None:
-        """Initialize the EpisodeDownloader instance."""
+        """Initialize the EpisodeDownloader instance.
+
+        If the episode information has already been retrieved, it can be passed as
+        `episode_info` to avoid requesting it again.
+        """
         self.episode_id = get_episode_id(url)
         self.live_manager = live_manager
         self.args = args
         self.max_workers = max_workers
 
-        # Lazy-loaded later
-        self._episode_info: dict[str, Any] | None = None
-        self._streams: dict[str, Any] | None = None
-        self._download_path: Path | None = None
+        # Lazy-loaded later, unless provided
+        self._episode_info = episode_info
+        self._download_path: str | None = None
+        self._overall_task: int | None = None
 
     def init_download(self) -> None:
-        """Initialize episode metadata, stream data, and download directory.
+        """Initialize episode metadata and download directory.
 
-        This method retrieves detailed episode information and available stream data
-        based on the episode ID. It also creates and stores the appropriate download
-        directory using the episode's title.
+        This method retrieves detailed episode information based on the episode ID,
+        unless it was already provided. It also creates and stores the appropriate
+        download directory using the episode's title.
         """
-        self._episode_info = get_hanime_info(self.episode_id)
-        self._streams = fetch_streams(self._episode_info)
+        if self._episode_info is None:
+            self._episode_info = get_hanime_info(self.episode_id)
+
         hanime_title = get_hanime_title(self._episode_info)
         self._download_path = create_download_directory(
             hanime_title, custom_path=self.args.custom_path,
         )
 
-    def download(self) -> None:
-        """Process the video stream and downloads the video."""
+    async def download(self) -> None:
+        """Process the video stream and downloads the video.
 
-        def log_and_exit(event: str, message: str) -> None:
-            self.live_manager.update_log(event, message)
-            sys.exit(1)
-
-        # Initialize the download process
-        self.init_download()
+        Raises `EpisodeDownloadError` if the episode cannot be downloaded.
+        """
+        resolution_indx, target_height = parse_resolution(self.args.resolution)
 
-        # Format the episode filename
-        filename = format_filename(self._streams, self.episode_id, self.args.resolution)
-        self.live_manager.add_overall_task(filename, num_tasks=1)
+        # Initialize the download process, off the event loop as it blocks on the API
+        await asyncio.to_thread(self.init_download)
 
         try:
             selected_stream = select_and_validate_stream(
-                self.args.resolution,
-                self._streams,
+                resolution_indx,
+                target_height,
+                fetch_streams(self._episode_info),
             )
             stream_url = selected_stream["url"]
 
-            response = httpx.get(stream_url)
-            response.raise_for_status()
+        except (KeyError, ValueError) as err:
+            self._log_and_raise(type(err).__name__, str(err))
 
-            m3u8_playlist = m3u8.loads(response.text)
-            segment_uris = m3u8_playlist.segments.uri
+        # Format the episode filename from the selected stream
+        filename = format_filename(selected_stream, self.episode_id)
+        self._overall_task = self.live_manager.add_overall_task(filename, num_tasks=1)
 
-        except (KeyError, ValueError) as err:
-            log_and_exit(type(err).__name__, str(err))
+        final_path = os.fspath(Path(self._download_path, filename))
+        await self._download_stream(
+            stream_url, final_path, get_stream_size(selected_stream),
+        )
 
-        except httpx.RequestError as req_err:
-            log_and_exit("Request error", req_err)
+    # Private methods
+    def _log_and_raise(self, event: str, message: str) -> NoReturn:
+        """Log a fatal event and abort the download of the episode."""
+        self.live_manager.update_log(event, message)
+        raise EpisodeDownloadError(message)
 
-        if not m3u8_playlist.keys or m3u8_playlist.keys[0] is None:
-            log_and_exit("No decryption key", "Missing decryption key in playlist")
+    async def _download_stream(
+        self, stream_url: str, final_path: str, stream_size: int | None,
+    ) -> None:
+        """Fetch the playlist and the key of a stream, then download its segments.
 
-        key_uri = m3u8_playlist.keys[0].uri
-        key_data = httpx.get(key_uri).content
-        decryptor = AES.new(key_data, AES.MODE_CBC)
+        All of these requests go through a single pooled HTTP/2 client, so the
+        connections to the CDN are established once and kept alive for the whole
+        episode.
+        """
+        limits = httpx.Limits(
+            max_connections=self.max_workers * 2,
+            max_keepalive_connections=self.max_workers,
+        )
+        async with httpx.AsyncClient(
+            http2=True, limits=limits, timeout=httpx.Timeout(30.0),
+        ) as client:
+            try:
+                playlist = parse_playlist(await fetch_playlist(client, stream_url))
 
-        final_path = Path(self._download_path) / filename
-        self._download_and_decrypt_segments(final_path, segment_uris, decryptor)
+            except (KeyError, ValueError) as err:
+                self._log_and_raise(type(err).__name__, str(err))
 
-    # Private methods
-    def _decrypt_with_padding(
-        self, data: bytes, decryptor: CbcMode, segment_uri: str,
-    ) -> bytes:
-        """Decrypt the given data with padding handling."""
-        padded_data = pad(data, decryptor.block_size)
-        decrypted_data = decryptor.decrypt(padded_data)
+            except httpx.HTTPError as http_err:
+                self._log_and_raise("Request error", str(http_err))
+
+            if playlist.key_uri is None:
+                self._log_and_raise(
+                    "No decryption key", "Missing decryption key in playlist",
+                )
+
+            # Fetched alongside the first segments, which only wait for it once their
+            # own response starts arriving
+            key = asyncio.create_task(self._fetch_key(client, playlist.key_uri))
+            session = _StreamSession(
+                client, asyncio.Semaphore(self.max_workers), playlist, key,
+            )
+
+            try:
+                await self._download_and_decrypt_segments(
+                    session, final_path, stream_size,
+                )
+
+            finally:
+                key.cancel()
+
+    async def _fetch_key(
+        self, client: httpx.AsyncClient, key_uri: str,
+    ) -> algorithms.AES:
+        """Fetch and validate the decryption key of a playlist.
 
+        The key is validated once here rather than by every segment, and any failure
+        aborts the download of the episode.
+        """
         try:
-            return unpad(decrypted_data, decryptor.block_size)
+            return algorithms.AES(await fetch_key(client, key_uri))
+
+        except httpx.HTTPError as http_err:
+            self._log_and_raise("Key request error", str(http_err))
+
+        except ValueError as val_err:
+            self._log_and_raise("Invalid decryption key", str(val_err))
+
+    async def _stream_and_decrypt(
+        self, session: _StreamSession, segment_id: int,
+    ) -> bytearray | None:
+        """Stream a segment and decrypt it chunk by chunk as it is received.
+
+        Chunks are decrypted straight into a single buffer, presized from the response
+        length when known, without allocating an intermediate object per chunk. Returns
+        None, after logging it, if the segment is not block-aligned.
+        """
+        segment_uri = session.playlist.segment_uris[segment_id]
+        iv = session.playlist.segment_iv(segment_id)
+        decrypted_size = 0
+
+        async with session.client.stream("GET", segment_uri) as response:
+            response.raise_for_status()
+
+            # Each segment is an independent CBC stream with its own IV
+            cipher = Cipher(await session.key, modes.CBC(iv))
+            decryptor = cipher.decryptor()
+
+            # The decryptor may hold back up to one block, hence the extra room
+            content_length = response.headers.get("Content-Length", "")
+            expected_size = int(content_length) if content_length.isdigit() else 0
+            decrypted_data = bytearray(expected_size + AES_BLOCK_SIZE - 1)
+
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                decrypted_size = _decrypt_into(
+                    decryptor, chunk, decrypted_data, decrypted_size,
+                )
+
+        # HLS segments are block-aligned, so CBC has nothing left to emit; a partial
+        # trailing block makes this raise a ValueError
+        try:
+            decryptor.finalize()
 
         except ValueError:
             self.live_manager.update_log(
                 "Decryption error",
-                f"Padding error for segment {segment_uri}. "
-                "Proceeding with partial data.",
+                f"Segment {segment_uri} is not block-aligned.",
             )
-            return decrypted_data
+            return None
+
+        del decrypted_data[decrypted_size:]
+        return decrypted_data
 
-    def _download_segment(
+    async def _download_segment(
         self,
-        segment_uri: str,
-        decryptor: CbcMode,
-        retries: int = 10,
-        max_delay: int = 30,
-    ) -> bytes | None:
+        session: _StreamSession,
+        segment_id: int,
+        retries: int = len(_BACKOFFS) + 1,
+    ) -> bytearray | None:
         """Download and decrypt a single segment with retry logic."""
+        segment_uri = session.playlist.segment_uris[segment_id]
+
         for attempt in range(retries):
             try:
-                response = httpx.get(segment_uri)
-                response.raise_for_status()
+                async with session.semaphore:
+                    return await self._stream_and_decrypt(session, segment_id)
+
+            except (httpx.HTTPStatusError, httpx.RequestError) as http_err:
+                # Fail fast, freeing the slot for segments that can still succeed
+                if not _is_retryable(http_err):
+                    break
 
-            except (httpx.HTTPStatusError, httpx.RequestError):
                 if attempt < retries - 1:
-                    backoff_delay = 2 ** (attempt + 1) + random.uniform(1, 3)  # noqa: S311
-                    delay = min(backoff_delay, max_delay)
-                    time.sleep(delay)
+                    await asyncio.sleep(_retry_delay(http_err, attempt))
                     self.live_manager.update_log(
                         "Request error",
                         f"Retrying to download segment {segment_uri}... "
                         f"({attempt + 1}/{retries})",
                     )
-                    continue
-
-            else:
-                data = response.content
-
-                # If the data length is not a multiple of the block size, apply
-                # padding before decryption
-                if len(data) % decryptor.block_size != 0:
-                    return self._decrypt_with_padding(data, decryptor, segment_uri)
-
-                return decryptor.decrypt(data)
 
         self.live_manager.update_log(
             "Failed segment download",
@@ -176,36 +352,121 @@ class EpisodeDownloader:
         )
         return None
 
-    def _download_and_decrypt_segments(
-        self,
-        final_path: str,
-        segment_uris: list[str],
-        decryptor: CbcMode,
+    async def _download_and_decrypt_segments(
+        self, session: _StreamSession, final_path: str, stream_size: int | None,
     ) -> None:
         """Download and decrypt video segments concurrently and write them in order."""
-        total_segments = len(segment_uris)
-        task = self.live_manager.add_task()
-        results: list[bytes | None] = [None] * total_segments
-
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {
-                executor.submit(self._download_segment, uri, decryptor): segment_id
-                for segment_id, uri in enumerate(segment_uris)
-            }
-            for current_segment, future in enumerate(as_completed(futures)):
-                segment_id = futures[future]
-                results[segment_id] = future.result()
-                completed = ((current_segment + 1) / total_segments) * 100
-                self.live_manager.update_task(task, completed=completed)
-
-        # Write all segments in order
-        with Path(final_path).open("ab") as video:
-            for segment_id, segment_data in enumerate(results):
-                if segment_data is None:
-                    self.live_manager.update_log(
-                        "Missing video segment",
-                        f"Segment {segment_id} is missing, skipping.",
+        # Only an episode with every segment written gets its final name
+        part_path = f"{final_path}.part"
+        with open(  # noqa: PTH123
+            part_path, "wb", buffering=WRITE_BUFFER_SIZE,
+        ) as video:
+            advise_sequential_write(video)
+            if stream_size:
+                await asyncio.to_thread(preallocate_file, video, stream_size)
+
+            missing_segments = await self._write_segments(
+                session, video, preallocated=bool(stream_size),
+            )
+
+            # The episode is not read back, so keep it out of the page cache
+            await asyncio.to_thread(release_file_cache, video)
+
+        if missing_segments:
+            self._log_and_raise(
+                "Incomplete download",
+                f"{missing_segments} segments are missing, kept {part_path}",
+            )
+
+        await asyncio.to_thread(os.replace, part_path, final_path)
+
+    async def _write_segments(
+        self, session: _StreamSession, video: BinaryIO, *, preallocated: bool,
+    ) -> int:
+        """Write the segments in playlist order and return how many are missing."""
+        total_segments = len(session.playlist.segment_uris)
+        task = self.live_manager.add_task(overall_task_id=self._overall_task)
+        segments_ahead = _SEGMENTS_AHEAD_PER_WORKER * self.max_workers
+        missing_segments = 0
+        write_buffer = bytearray()
+
+        # Downloads are consumed in playlist order, and dropped once written
+        downloads = deque(
+            asyncio.create_task(self._download_segment(session, segment_id))
+            for segment_id in range(min(segments_ahead, total_segments))
+        )
+
+        try:
+            for segment_id in range(total_segments):
+                missing_segments += not await self._write_segment(
+                    video, write_buffer, segment_id, await downloads.popleft(),
+                )
+
+                next_segment_id = segment_id + segments_ahead
+                if next_segment_id < total_segments:
+                    downloads.append(
+                        asyncio.create_task(
+                            self._download_segment(session, next_segment_id),
+                        ),
+                    )
+
+                written_segments = segment_id + 1
+                if (
+                    not preallocated
+                    and written_segments == _PREALLOCATE_AFTER < total_segments
+                ):
+                    # Nothing has been truncated yet, so the written bytes are the
+                    # file position plus the pending buffer
+                    await asyncio.to_thread(
+                        preallocate_file,
+                        video,
+                        (video.tell() + len(write_buffer))
+                        * total_segments // written_segments,
                     )
-                    continue
 
-                video.write(segment_data)
+                # Only refresh the progress bar when its displayed percentage changes
+                percent = written_segments * 100 // total_segments
+                if percent != segment_id * 100 // total_segments:
+                    self.live_manager.update_task(task, completed=percent)
+
+            # Report a failed key request even if every segment failed before needing it
+            await session.key
+
+        finally:
+            # Stop the downloads still pending if the episode is aborted
+            for download in downloads:
+                download.cancel()
+
+            await asyncio.gather(*downloads, return_exceptions=True)
+
+        # Flush whatever is left below the write threshold, then drop the unused tail
+        # of the reserved space
+        await asyncio.to_thread(video.write, write_buffer)
+        await asyncio.to_thread(video.truncate, video.tell())
+        return missing_segments
+
+    async def _write_segment(
+        self,
+        video: BinaryIO,
+        write_buffer: bytearray,
+        segment_id: int,
+        segment_data: bytearray | None,
+    ) -> bool:
+        """Queue a decrypted segment for writing, returning False if it is missing."""
+        if segment_data is None:
+            self.live_manager.update_log(
+                "Missing video segment",
+                f"Segment {segment_id} is missing, skipping.",
+            )
+            return False
+
+        if not write_buffer and len(segment_data) >= WRITE_BUFFER_SIZE:
+            await asyncio.to_thread(video.write, segment_data)
+            return True
+
+        write_buffer += segment_data
+        if len(write_buffer) >= WRITE_BUFFER_SIZE:
+            await asyncio.to_thread(video.write, write_buffer)
+            write_buffer.clear()
+
+        return True
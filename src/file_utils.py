@@ -1,24 +1,45 @@
 """Utilities functions for file input and output operations.
 
-It includes methods to read the contents of a file and to write content to a file, with
-optional support for clearing the file.
+It includes methods to read the contents of a file, either at once or lazily line by
+line, and to write content to a file, with optional support for clearing the file.
 """
 
 from __future__ import annotations
 
+import contextlib
+import functools
 import logging
 import os
-import re
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
 
 from .config import DOWNLOAD_FOLDER
 
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Translation tables replacing the characters not allowed in directory names with
+# underscores: Windows forbids a wider set than macOS and Linux. Unknown platforms get
+# the POSIX set.
+_NT_TRANS = str.maketrans(dict.fromkeys('\\/:*?"<>|', "_"))
+_POSIX_TRANS = str.maketrans(dict.fromkeys("/:", "_"))
+_INVALID_CHARS_TRANS = _NT_TRANS if os.name == "nt" else _POSIX_TRANS
+
+# Download directories already created during this session
+_created_directories: set[str] = set()
+
+
+def iter_file(filename: str) -> Iterator[str]:
+    """Lazily yield the lines of a file, without their line endings."""
+    with Path(filename).open(encoding="utf-8") as file:
+        for line in file:
+            yield line.rstrip("\r\n")
+
 
 def read_file(filename: str) -> list[str]:
     """Read the contents of a file and returns a list of its lines."""
-    with Path(filename).open(encoding="utf-8") as file:
-        return file.read().splitlines()
+    return list(iter_file(filename))
 
 
 def write_file(filename: str, content: str = "") -> None:
@@ -30,17 +51,44 @@ def write_file(filename: str, content: str = "") -> None:
         file.write(content)
 
 
+def preallocate_file(file: BinaryIO, size: int) -> None:
+    """Reserve disk space for a file being written, ignoring any failure."""
+    with contextlib.suppress(OSError):
+        if hasattr(os, "posix_fallocate"):
+            file.flush()
+            os.posix_fallocate(file.fileno(), 0, size)
+
+        elif size > file.tell():
+            file.truncate(size)
+
+
+def advise_sequential_write(file: BinaryIO) -> None:
+    """Hint that a file is written sequentially, ignoring any failure."""
+    with contextlib.suppress(AttributeError, OSError):
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+
+def release_file_cache(file: BinaryIO) -> None:
+    """Flush a written file to disk and drop its pages from the page cache."""
+    file.flush()
+    os.fsync(file.fileno())
+
+    with contextlib.suppress(AttributeError, OSError):
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
 def sanitize_directory_name(directory_name: str) -> str:
     """Sanitize a given directory name by replacing invalid characters with underscores.
 
     Handles the invalid characters specific to Windows, macOS, and Linux.
     """
-    invalid_chars_dict = {
-        "nt": r'[\\/:*?"<>|]',  # Windows
-        "posix": r"[/:]",       # macOS and Linux
-    }
-    invalid_chars = invalid_chars_dict.get(os.name)
-    return re.sub(invalid_chars, "_", directory_name)
+    return directory_name.translate(_INVALID_CHARS_TRANS)
+
+
+@functools.cache
+def _get_base_path(custom_path: str | None) -> Path:
+    """Return the base download path, which only depends on the custom path."""
+    return Path(custom_path) / DOWNLOAD_FOLDER if custom_path else Path(DOWNLOAD_FOLDER)
 
 
 def create_download_directory(
@@ -54,9 +102,7 @@ def create_download_directory(
     )
 
     # Determine the base download path.
-    base_path = (
-        Path(custom_path) / DOWNLOAD_FOLDER if custom_path else Path(DOWNLOAD_FOLDER)
-    )
+    base_path = _get_base_path(custom_path)
 
     # Albums containing a single file will be directly downloaded into the 'Downloads'
     # folder, without creating a subfolder for the album ID.
@@ -64,6 +110,12 @@ def create_download_directory(
         base_path / sanitized_directory_name if sanitized_directory_name else base_path
     )
 
+    # Skip the directories already created during this session, such as the one shared
+    # by all the episodes of a series
+    download_dir = str(download_path)
+    if download_dir in _created_directories:
+        return download_dir
+
     # Create the directory if it doesn't exist
     try:
         download_path.mkdir(parents=True, exist_ok=True)
@@ -73,4 +125,5 @@ def create_download_directory(
         logging.exception(log_message)
         sys.exit(1)
 
-    return str(download_path)
+    _created_directories.add(download_dir)
+    return download_dir
@@ -2,16 +2,37 @@
 
 from __future__ import annotations
 
+import ctypes
 import os
+import sys
+
+# ANSI sequence clearing the screen and moving the cursor to its top-left corner
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+
+# Windows console API constants
+STD_OUTPUT_HANDLE = -11
+ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
+
+
+def enable_ansi_escapes() -> None:
+    """Enable ANSI escape processing on the Windows console.
+
+    Modern terminals handle ANSI escapes natively; legacy Windows consoles need it to
+    be switched on for the standard output handle.
+    """
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.GetStdHandle(STD_OUTPUT_HANDLE)
+    mode = ctypes.c_uint32()
+
+    if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+        kernel32.SetConsoleMode(handle, mode.value | ENABLE_VIRTUAL_TERMINAL_PROCESSING)
+
+
+if os.name == "nt":
+    enable_ansi_escapes()
 
 
 def clear_terminal() -> None:
-    """Clear the terminal screen based on the operating system."""
-    commands = {
-        "nt": "cls",       # Windows
-        "posix": "clear",  # macOS and Linux
-    }
-
-    command = commands.get(os.name)
-    if command:
-        os.system(command)  # noqa: S605
+    """Clear the terminal screen by writing the ANSI clear sequence."""
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
@@ -46,13 +46,18 @@ class LiveManager:
         self.start_time = time.time()
         self.update_log("Script started", "The script has started execution.")
 
-    def add_overall_task(self, description: str, num_tasks: int) -> None:
+    def add_overall_task(self, description: str, num_tasks: int) -> int:
         """Call ProgressManager to add an overall task."""
-        self.progress_manager.add_overall_task(description, num_tasks)
+        return self.progress_manager.add_overall_task(description, num_tasks)
 
-    def add_task(self, current_task: int = 0, total: int = 100) -> None:
+    def add_task(
+        self,
+        current_task: int = 0,
+        total: int = 100,
+        overall_task_id: int | None = None,
+    ) -> int:
         """Call ProgressManager to add an individual task."""
-        return self.progress_manager.add_task(current_task, total)
+        return self.progress_manager.add_task(current_task, total, overall_task_id)
 
     def update_task(
         self,
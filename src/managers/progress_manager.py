@@ -40,22 +40,34 @@ class ProgressManager:
         self.num_tasks = 0
         self.overall_buffer = deque(maxlen=overall_buffer_size)
 
-    def add_overall_task(self, description: str, num_tasks: int) -> None:
+    def add_overall_task(self, description: str, num_tasks: int) -> int:
         """Add an overall progress task with a given description and total tasks."""
         self.num_tasks = num_tasks
         overall_description = self._adjust_description(description)
-        self.overall_progress.add_task(
+        return self.overall_progress.add_task(
             f"[{self.color}]{overall_description}",
             total=num_tasks,
             completed=0,
         )
 
-    def add_task(self, current_task: int = 0, total: int = 100) -> int:
-        """Add an individual task to the task progress bar."""
+    def add_task(
+        self,
+        current_task: int = 0,
+        total: int = 100,
+        overall_task_id: int | None = None,
+    ) -> int:
+        """Add an individual task to the task progress bar.
+
+        If `overall_task_id` is given, the task advances that overall task when it
+        finishes; otherwise it advances the most recently added overall task.
+        """
         task_description = (
             f"[{self.color}]{self.item_description} {current_task + 1}/{self.num_tasks}"
         )
-        return self.task_progress.add_task(task_description, total=total)
+        # The overall task is kept in the task's own fields
+        return self.task_progress.add_task(
+            task_description, total=total, overall_task_id=overall_task_id,
+        )
 
     def update_task(
         self,
@@ -98,8 +110,16 @@ class ProgressManager:
     # Private methods
     def _update_overall_task(self, task_id: int) -> None:
         """Advance the overall progress bar and removes old tasks."""
-        # Access the latest task dynamically
-        current_overall_task = self.overall_progress.tasks[-1]
+        # Access the task's own overall task, or the latest one dynamically
+        overall_task_id = self.task_progress.tasks[task_id].fields["overall_task_id"]
+        current_overall_task = next(
+            (
+                overall_task
+                for overall_task in self.overall_progress.tasks
+                if overall_task.id == overall_task_id
+            ),
+            self.overall_progress.tasks[-1],
+        )
 
         # If the task is finished, remove it and update the overall progress
         if self.task_progress.tasks[task_id].finished: